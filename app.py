@@ -1,8 +1,16 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 from PIL import Image
+import io
 import os
+import re
+from collections import defaultdict
 
 st.set_page_config(page_title="Smargri: Basmati Intelligence Portal", layout="wide")
 st.title("Smart Agri: Basmati Intelligence Portal")
@@ -10,48 +18,274 @@ st.title("Smart Agri: Basmati Intelligence Portal")
 # Top-level section selection including "Quality"
 section = st.radio("Select Section", options=["Meteorological Variable", "Market", "What If", "Quality"], horizontal=True)
 
+# Partition columns of every meteorological CSV; constant within a single file
+MET_PARTITION_COLUMNS = ("State", "District", "Block")
+
+# Value columns stored in each meteorological variable's file
+MET_VALUE_COLUMNS = {
+    "Rainfall": ["Rainfall"],
+    "Temperature": ["Max_Temperature", "Min_Temperature"],
+}
+
+# Line colours for the meteorological plots; unlisted columns use the default sequence
+MET_LINE_COLORS = {"Max_Temperature": "darkred", "Min_Temperature": "lightcoral"}
+
+# Upper bound on points per plotted line; longer series are downsampled with LTTB
+MET_MAX_PLOT_POINTS = 1500
+
+# Typed Parquet copies of the meteorological CSVs. Kept outside the data folder so
+# writing them never changes the folder signature that keys the file index.
+MET_PARQUET_CACHE_DIR = ".met_parquet_cache"
+
+# Images are downscaled to fit this box before being sent to the browser; the
+# wide layout rarely shows them larger
+IMAGE_MAX_SIZE = (1600, 1600)
+
+# Explicit Arrow types for the meteorological CSVs, so nothing is inferred at read time
+MET_COLUMN_TYPES = {
+    "State": pa.string(),
+    "District": pa.string(),
+    "Block": pa.string(),
+    "Date": pa.string(),  # converted in load_met_csv so malformed dates become nulls
+    "Rainfall": pa.float32(),
+    "Max_Temperature": pa.float32(),
+    "Min_Temperature": pa.float32(),
+}
+
+# -----------------------------
+# Helper: Folder signature used as a cache key by the directory scans below
+# -----------------------------
+def _dir_signature(folder):
+    """
+    Returns the folder's modification time (or None if it is missing).
+    Adding, removing or renaming a file bumps it, so cached dictionaries built
+    from filenames are rebuilt only when the listing actually changes.
+    """
+    try:
+        return os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+# -----------------------------
+# Helper: Sort nested option dictionaries once, at build time
+# -----------------------------
+def _sort_nested(d):
+    """
+    Returns a copy of a nested dict with its keys sorted at every level, so the
+    sidebar can list options in order without re-sorting on each rerun. Nested
+    defaultdicts come back as plain dicts.
+    """
+    return {k: _sort_nested(v) if isinstance(v, dict) else v for k, v in sorted(d.items())}
+
 # -----------------------------
 # Helper: Build CSV file dictionary for Meteorological Variables
 # -----------------------------
-def build_file_dict_from_csv(folder):
+# State_District_Block_variable (filename without the .csv extension)
+MET_FILENAME_PATTERN = re.compile(r"^([^_]+)_([^_]+)_([^_]+)_(.+)$")
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_file_dict_from_csv(folder, signature):
     """
     Reads CSV files from the specified folder and parses their filenames into a nested dict:
       { state: { "District-Block": { variable: file_path } } }
     
     Expected filename format:
       State_District_Block_variable.csv
+    
+    `signature` is the folder's _dir_signature(); it only serves as the cache key
+    so Streamlit reruns reuse the dict until the folder contents change.
     """
-    file_dict = {}
-    if not os.path.exists(folder):
+    file_dict = defaultdict(lambda: defaultdict(dict))
+    if signature is None:
         st.error(f"Folder '{folder}' not found.")
         return None
     
-    csv_files = [f for f in os.listdir(folder) if f.endswith(".csv")]
-    if not csv_files:
+    with os.scandir(folder) as it:
+        csv_entries = [e for e in it if e.name.endswith(".csv") and e.is_file()]
+    if not csv_entries:
         st.error(f"No CSV files found in the folder '{folder}'.")
         return None
     
-    for filename in csv_files:
-        file_path = os.path.join(folder, filename)
-        parts = filename.split(".")[0].split("_")
-        if len(parts) < 4:
-            st.warning(f"Filename '{filename}' does not have enough parts. Skipping.")
+    for entry in csv_entries:
+        match = MET_FILENAME_PATTERN.match(os.path.splitext(entry.name)[0])
+        if match is None:
+            st.warning(f"Filename '{entry.name}' does not have enough parts. Skipping.")
             continue
 
-        state = parts[0]
-        district = parts[1]
-        block = parts[2]
-        variable = "_".join(parts[3:])
-        
+        state, district, block, variable = match.groups()
         district_block = f"{district}-{block}"
-        file_dict.setdefault(state, {}).setdefault(district_block, {})[variable] = file_path
+        file_dict[state][district_block][variable] = entry.path
+
+    return _sort_nested(file_dict)
 
-    return file_dict
+# -----------------------------
+# Helper: Load a meteorological CSV (cached across reruns)
+# -----------------------------
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_met_csv(file_path, variable, mtime):
+    """
+    Reads a single State_District_Block_variable.csv file and returns only the
+    'Date' column and its value columns, dropping the constant partition columns.
+    
+    For variables listed in MET_VALUE_COLUMNS only those columns are converted;
+    other files are read in full and then projected.
+    
+    The projected table is also saved as a zstd Parquet file in
+    MET_PARQUET_CACHE_DIR, so later cold starts skip CSV parsing. Its metadata
+    records the CSV's exact mtime and size plus the column layout it was built
+    with, and the file is only reused while all of them still match.
+    
+    `mtime` is the CSV's modification time (ns); it serves as the cache key so
+    repeated selections reuse the parsed frame until the file is rewritten.
+    """
+    value_cols = MET_VALUE_COLUMNS.get(variable)
+    include_columns = ["Date", *value_cols] if value_cols else []  # [] reads every column
+    
+    csv_stat = os.stat(file_path)
+    sidecar_key = {
+        b"source_mtime_ns": str(csv_stat.st_mtime_ns).encode(),
+        b"source_size": str(csv_stat.st_size).encode(),
+        b"layout": repr((include_columns, sorted((k, str(v)) for k, v in MET_COLUMN_TYPES.items()))).encode(),
+    }
+    parquet_path = os.path.join(MET_PARQUET_CACHE_DIR, os.path.splitext(os.path.basename(file_path))[0] + ".parquet")
+    try:
+        sidecar_metadata = pq.read_schema(parquet_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        sidecar_metadata = {}
+    if all(sidecar_metadata.get(k) == v for k, v in sidecar_key.items()):
+        return pq.read_table(parquet_path).to_pandas()
+    
+    # Arrow's multithreaded reader parses the typed columns directly
+    table = pv.read_csv(
+        file_path,
+        convert_options=pv.ConvertOptions(column_types=MET_COLUMN_TYPES, include_columns=include_columns),
+    )
+    # Dates are ISO formatted, so a fixed format skips per-row inference; like the
+    # former errors='coerce', malformed dates become nulls and those rows are dropped
+    if "Date" in table.column_names:
+        dates = pc.strptime(table["Date"], format="%Y-%m-%d", unit="ns", error_is_null=True)
+        table = table.set_column(table.schema.get_field_index("Date"), "Date", dates)
+        table = table.filter(pc.is_valid(dates))
+    # Drop the string columns before conversion so they never become Python objects
+    table = table.drop_columns([col for col in MET_PARTITION_COLUMNS if col in table.column_names])
+    
+    # Write to a temporary file first so other sessions never read a partial Parquet file
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(MET_PARQUET_CACHE_DIR, exist_ok=True)
+        pq.write_table(table.replace_schema_metadata(sidecar_key), tmp_path, compression="zstd")
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        # Read-only deployments simply keep parsing the CSV
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return table.to_pandas()
+
+# -----------------------------
+# Helper: Downsample long daily series before plotting
+# -----------------------------
+def _lttb_indices(x, y, max_points=MET_MAX_PLOT_POINTS):
+    """
+    Largest-Triangle-Three-Buckets: returns the indices of at most `max_points`
+    points of the (x-sorted) series that preserve its visual shape, including
+    peaks that bin averaging would flatten. Decades of daily data are far more
+    points than the plot has pixels, and every point is serialised to the browser.
+    """
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    
+    # The first and last points are always kept; the rest is split into equal buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Third vertex: mean of the next bucket (or the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area formed with the previously selected point
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(areas.argmax())
+        indices[i + 1] = selected
+    return indices
+
+# -----------------------------
+# Helper: Build the line chart for meteorological CSVs (cached across reruns)
+# -----------------------------
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_met_figure(files):
+    """
+    Loads meteorological CSVs via load_met_csv and returns a single Plotly figure
+    with one row per file, all sharing the Date axis, or None if there is nothing
+    to plot.
+    
+    `files` is a tuple of (variable, file_path, mtime). The figure is cached on it,
+    so going back to a previously viewed block reuses the finished figure instead
+    of rebuilding it.
+    """
+    panels = []
+    for variable, file_path, mtime in files:
+        # A file that fails to parse only drops its own panel
+        try:
+            df = load_met_csv(file_path, variable, mtime)
+        except Exception as e:
+            st.error(f"Error processing CSV for {variable}: {e}")
+            continue
+
+        # Ensure that there is a 'Date' column. Adjust column names as necessary.
+        if 'Date' not in df.columns:
+            st.error(f"CSV for {variable} does not have a 'Date' column.")
+            continue
+        
+        # Determine which columns to plot (every column that is not 'Date')
+        value_cols = [col for col in df.columns if col != 'Date']
+        if not value_cols:
+            st.error(f"No value column found to plot for {variable}.")
+            continue
+        panels.append((df, value_cols, " / ".join(value_cols)))
+    
+    if not panels:
+        return None
+    
+    # Plotly rejects spacing above 1 / (rows - 1), so shrink the gap for many panels
+    vertical_spacing = min(0.12, 0.9 / max(len(panels) - 1, 1))
+    fig = make_subplots(rows=len(panels), cols=1, shared_xaxes=True, vertical_spacing=vertical_spacing,
+                        subplot_titles=[f"{value_label} over time" for _, _, value_label in panels])
+    for row, (df, value_cols, value_label) in enumerate(panels, start=1):
+        # One trace per value column (e.g. Max and Min temperature), built straight
+        # from the columns without reshaping to long form. WebGL traces match what
+        # plotly.express chose for series of this length.
+        days = df['Date'].to_numpy().astype('datetime64[D]')
+        x = days.astype(np.int64).astype(np.float64)
+        for col in value_cols:
+            y = df[col].to_numpy()
+            idx = _lttb_indices(x, y)
+            # Daily data: date-only ISO strings keep the serialised x arrays short;
+            # float32 y arrays already ship as binary.
+            fig.add_trace(go.Scattergl(x=np.datetime_as_string(days[idx]), y=y[idx], mode='lines',
+                                       name=col, line_color=MET_LINE_COLORS.get(col)),
+                          row=row, col=1)
+        fig.update_yaxes(title_text=value_label, row=row, col=1)
+    
+    fig.update_xaxes(type="date")
+    fig.update_xaxes(title_text="Date", row=len(panels), col=1)
+    fig.update_layout(height=450 * len(panels), legend_title_text="Variable")
+    return fig
 
 # -----------------------------
 # Helper: Build file dictionary from PNG files (for Market and Quality)
 # -----------------------------
-def build_file_dict_from_folder(folder):
+# State_District_Block_Var or State_District_Block_Var_sinceYYYY (filename without extension)
+MARKET_FILENAME_PATTERN = re.compile(r"^([^_]+)_([^_]+)_([^_]+)_(.+?)(?:_since([^_]*))?$")
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_file_dict_from_folder(folder, signature):
     """
     Reads PNG files from the specified folder and parses their filenames into a nested dict:
       { state: { "District-Block": { var_label: file_path } } }
@@ -59,47 +293,45 @@ def build_file_dict_from_folder(folder):
     Expected filename formats:
       State_District_Block_Var.png  
       State_District_Block_Var_sinceYYYY.png
+    
+    `signature` is the folder's _dir_signature() and only serves as the cache key.
     """
-    file_dict = {}
-    if not os.path.exists(folder):
+    file_dict = defaultdict(lambda: defaultdict(dict))
+    if signature is None:
         st.error(f"Folder '{folder}' not found.")
         return None
     
-    png_files = [f for f in os.listdir(folder) if f.endswith(".png")]
-    if not png_files:
+    with os.scandir(folder) as it:
+        png_entries = [e for e in it if e.name.endswith(".png") and e.is_file()]
+    if not png_entries:
         st.error(f"No PNG files found in the folder '{folder}'.")
         return None
     
-    for filename in png_files:
-        file_path = os.path.join(folder, filename)
-        parts = filename.split(".")[0].split("_")
-        if len(parts) < 4:
-            st.warning(f"Filename '{filename}' does not have enough parts. Skipping.")
+    for entry in png_entries:
+        match = MARKET_FILENAME_PATTERN.match(os.path.splitext(entry.name)[0])
+        if match is None:
+            st.warning(f"Filename '{entry.name}' does not have enough parts. Skipping.")
             continue
 
-        state = parts[0]
-        district = parts[1]
-        block = parts[2]
-        var_parts = parts[3:]
-        if len(var_parts) >= 2 and var_parts[-1].startswith("since"):
-            var_name = "_".join(var_parts[:-1])
-            year_str = var_parts[-1].replace("since", "").strip()
-            var_label = f"{var_name} since {year_str}"
-        else:
-            var_label = "_".join(var_parts)
+        state, district, block, var_name, year_str = match.groups()
+        var_label = var_name if year_str is None else f"{var_name} since {year_str}"
         
         if var_label.startswith("Temp"):
             var_label = var_label.replace("Temp", "Temperature", 1)
         
         district_block = f"{district}-{block}"
-        file_dict.setdefault(state, {}).setdefault(district_block, {})[var_label] = file_path
+        file_dict[state][district_block][var_label] = entry.path
 
-    return file_dict
+    return _sort_nested(file_dict)
 
 # -----------------------------
 # Helper: Build quality dictionaries from image files (for Quality section)
 # -----------------------------
-def build_quality_dicts(folder):
+# State_District_Block_QualityParameter[_Percentile[_...]] (filename without extension)
+QUALITY_FILENAME_PATTERN = re.compile(r"^([^_]+)_([^_]+)_([^_]+)_([^_]+)(?:_([^_]+)(?:_.*)?)?$")
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_quality_dicts(folder, signature):
     """
     Reads image files (JPG or PNG) from the specified folder and separates them into two dictionaries:
     
@@ -112,104 +344,124 @@ def build_quality_dicts(folder):
     Both dictionaries are structured as:
       base_dict[state][district_block][quality_param] = file_path
       perc_dict[state][district_block][quality_param][percentile] = file_path
+    
+    `signature` is the folder's _dir_signature() and only serves as the cache key.
     """
-    base_dict = {}
-    perc_dict = {}
+    base_dict = defaultdict(lambda: defaultdict(dict))
+    perc_dict = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
     
-    if not os.path.exists(folder):
+    if signature is None:
         st.error(f"Folder '{folder}' not found.")
         return None, None
     
-    quality_files = [f for f in os.listdir(folder) if f.lower().endswith((".jpg", ".png"))]
-    if not quality_files:
+    with os.scandir(folder) as it:
+        quality_entries = [e for e in it if e.name.lower().endswith((".jpg", ".png")) and e.is_file()]
+    if not quality_entries:
         st.error(f"No image files found in the folder '{folder}'.")
         return None, None
     
-    for filename in quality_files:
-        file_path = os.path.join(folder, filename)
-        parts = filename.split(".")[0].split("_")
-        if len(parts) < 4:
-            st.warning(f"Filename '{filename}' does not have enough parts. Skipping.")
+    for entry in quality_entries:
+        match = QUALITY_FILENAME_PATTERN.match(os.path.splitext(entry.name)[0])
+        if match is None:
+            st.warning(f"Filename '{entry.name}' is not in an expected format. Skipping.")
             continue
         
-        state = parts[0]
-        district = parts[1]
-        block = parts[2]
+        state, district, block, quality_param, percentile = match.groups()
         district_block = f"{district}-{block}"
         
-        # Base image: exactly 4 parts
-        if len(parts) == 4:
-            quality_param = parts[3]
-            base_dict.setdefault(state, {}).setdefault(district_block, {})[quality_param] = file_path
-        # Percentile image: 5 or more parts
-        elif len(parts) >= 5:
-            quality_param = parts[3]
-            percentile = parts[4]
-            perc_dict.setdefault(state, {}).setdefault(district_block, {}).setdefault(quality_param, {})[percentile] = file_path
+        # Base image: no percentile part
+        if percentile is None:
+            base_dict[state][district_block][quality_param] = entry.path
+        # Percentile image: a fifth part (any further parts are ignored)
         else:
-            st.warning(f"Filename '{filename}' is not in an expected format. Skipping.")
+            perc_dict[state][district_block][quality_param][percentile] = entry.path
+    
+    return _sort_nested(base_dict), _sort_nested(perc_dict)
+
+# -----------------------------
+# Helper: Downscale oversized images once, reuse the bytes across reruns
+# -----------------------------
+@st.cache_resource(show_spinner=False, max_entries=128)
+def _load_display_image(file_path, mtime):
+    """
+    Returns the bytes to display for an image. Files that already fit
+    IMAGE_MAX_SIZE are returned unchanged; larger ones are shrunk to fit and
+    encoded as WebP, losslessly for PNG sources so thin chart lines and text stay
+    sharp. Cached as a resource, so switching between parameters or percentiles
+    reuses the encoded image instead of decoding the full-resolution file again;
+    `mtime` only serves as the cache key.
+    """
+    with Image.open(file_path) as image:
+        if image.width <= IMAGE_MAX_SIZE[0] and image.height <= IMAGE_MAX_SIZE[1]:
+            with open(file_path, "rb") as f:
+                return f.read()
+        lossless = image.format == "PNG"
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image.thumbnail(IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        image.save(buf, format="WEBP", lossless=lossless, quality=85)
+    return buf.getvalue()
+
+def load_display_image(file_path):
+    """Returns the cached display bytes (for st.image) of the image at file_path."""
+    return _load_display_image(file_path, os.stat(file_path).st_mtime_ns)
+
+# -----------------------------
+# Helper: State and District-Block dropdowns shared by every section
+# -----------------------------
+def select_district_block(options_dict):
+    """
+    Renders the 'Select State' and 'Select District-Block' sidebar dropdowns for a
+    nested { state: { "District-Block": ... } } dict (already sorted when built).
     
-    return base_dict, perc_dict
+    Returns:
+      (state_selected, district_block_selected), each "select" until chosen
+    """
+    state_selected = st.sidebar.selectbox("Select State", ["select"] + list(options_dict))
+    if state_selected == "select":
+        return state_selected, "select"
+    
+    district_block_options = list(options_dict[state_selected])
+    district_block_selected = st.sidebar.selectbox("Select District-Block", ["select"] + district_block_options)
+    return state_selected, district_block_selected
 
 # -----------------------------
 # Meteorological Variable Section using CSV files and interactive plots
 # -----------------------------
 if section == "Meteorological Variable":
     st.sidebar.header("Meteorological Variable Options")
-    csv_folder = "Meteorological Variables"  # Folder containing CSV files for meteorological variables
-    file_dict = build_file_dict_from_csv(csv_folder)
+    csv_folder = "Met"  # Per State/District/Block CSV files for meteorological variables
+    file_dict = build_file_dict_from_csv(csv_folder, _dir_signature(csv_folder))
     
     if file_dict:
-        state_options = sorted(list(file_dict.keys()))
-        state_selected = st.sidebar.selectbox("Select State", ["select"] + state_options)
+        state_selected, district_block_selected = select_district_block(file_dict)
         
-        if state_selected != "select":
-            district_block_options = sorted(list(file_dict[state_selected].keys()))
-            district_block_selected = st.sidebar.selectbox("Select District-Block", ["select"] + district_block_options)
+        if district_block_selected != "select":
+            vars_list = list(file_dict[state_selected][district_block_selected])
+            variable_options = ["select", "All"] + vars_list
+            variable_selected = st.sidebar.selectbox("Select Meteorological Variable", variable_options)
             
-            if district_block_selected != "select":
-                vars_list = sorted(list(file_dict[state_selected][district_block_selected].keys()))
-                variable_options = ["select", "All"] + vars_list
-                variable_selected = st.sidebar.selectbox("Select Meteorological Variable", variable_options)
-                
-                if variable_selected != "select":
-                    def plot_csv(file_path):
-                        try:
-                            df = pd.read_csv(file_path)
-                            
-                            # Ensure that there is a 'date' column. Adjust column names as necessary.
-                            if 'date' not in df.columns:
-                                st.error("CSV does not have a 'date' column.")
-                                return
-                            
-                            # Convert 'date' column to datetime
-                            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                            
-                            # Determine which column to plot (e.g., first column that is not 'date')
-                            value_cols = [col for col in df.columns if col.lower() != "date"]
-                            if not value_cols:
-                                st.error("No value column found to plot.")
-                                return
-                            
-                            # For simplicity, plot the first non-date column
-                            value_col = value_cols[0]
-                            
-                            fig = px.line(df, x='date', y=value_col, title=f"{value_col} over time")
+            if variable_selected != "select":
+                def plot_csv(variables_and_paths):
+                    try:
+                        files = tuple((variable, file_path, os.stat(file_path).st_mtime_ns)
+                                      for variable, file_path in variables_and_paths)
+                        fig = build_met_figure(files)
+                        if fig is not None:
                             st.plotly_chart(fig, use_container_width=True)
-                        except Exception as e:
-                            st.error(f"Error processing CSV: {e}")
-                    
-                    if variable_selected == "All":
-                        # Plot for all available variables
-                        for var_label, file_path in file_dict[state_selected][district_block_selected].items():
-                            st.write(f"### {var_label}")
-                            plot_csv(file_path)
+                    except Exception as e:
+                        st.error(f"Error processing CSV: {e}")
+                
+                if variable_selected == "All":
+                    # Plot all available variables as rows of one figure with a shared Date axis
+                    plot_csv(file_dict[state_selected][district_block_selected].items())
+                else:
+                    file_path = file_dict[state_selected][district_block_selected].get(variable_selected)
+                    if file_path:
+                        plot_csv([(variable_selected, file_path)])
                     else:
-                        file_path = file_dict[state_selected][district_block_selected].get(variable_selected)
-                        if file_path:
-                            plot_csv(file_path)
-                        else:
-                            st.error("No CSV file found for the selected options.")
+                        st.error("No CSV file found for the selected options.")
 
 # -----------------------------
 # Quality Section using local image files
@@ -217,80 +469,75 @@ if section == "Meteorological Variable":
 elif section == "Quality":
     st.sidebar.header("Quality Options")
     quality_folder = "Quality"  # Folder containing quality images
-    base_dict, perc_dict = build_quality_dicts(quality_folder)
+    base_dict, perc_dict = build_quality_dicts(quality_folder, _dir_signature(quality_folder))
     
     if base_dict is None:
         st.info("No quality images available.")
     else:
-        state_options = sorted(base_dict.keys())
-        state_selected = st.sidebar.selectbox("Select State", ["select"] + state_options)
+        state_selected, district_block_selected = select_district_block(base_dict)
         
-        if state_selected != "select":
-            district_block_options = sorted(base_dict[state_selected].keys())
-            district_block_selected = st.sidebar.selectbox("Select District-Block", ["select"] + district_block_options)
+        if district_block_selected != "select":
+            # First dropdown: Quality Parameter (base image without percentile)
+            quality_params = list(base_dict[state_selected][district_block_selected])
+            quality_param_selected = st.sidebar.selectbox("Select Quality Parameter", ["select", "All"] + quality_params)
             
-            if district_block_selected != "select":
-                # First dropdown: Quality Parameter (base image without percentile)
-                quality_params = sorted(base_dict[state_selected][district_block_selected].keys())
-                quality_param_selected = st.sidebar.selectbox("Select Quality Parameter", ["select", "All"] + quality_params)
-                
-                # Default: show base image unless a percentile is selected
-                show_base = True
-                
-                if quality_param_selected != "select" and quality_param_selected != "All":
-                    # Check if percentile images exist for the selected quality parameter.
-                    if (perc_dict and 
-                        state_selected in perc_dict and 
-                        district_block_selected in perc_dict[state_selected] and 
-                        quality_param_selected in perc_dict[state_selected][district_block_selected]):
-                        pct_dict = perc_dict[state_selected][district_block_selected][quality_param_selected]
-                        percentile_options = sorted(pct_dict.keys())
-                        formatted_options = ["select", "All"] + [f"At {opt} percentile" for opt in percentile_options]
-                        percentile_selected = st.sidebar.selectbox("Select True vs Predicted", formatted_options)
-                        
-                        if percentile_selected != "select":
-                            # When a specific percentile is chosen, hide base image.
-                            show_base = False
-                            if percentile_selected == "All":
-                                for opt, file_path in pct_dict.items():
-                                    try:
-                                        image = Image.open(file_path)
-                                        st.image(image, use_container_width=True)
-                                    except Exception as e:
-                                        st.error(f"Error opening {file_path}: {e}")
+            # Default: show base image unless a percentile is selected
+            show_base = True
+            
+            if quality_param_selected != "select" and quality_param_selected != "All":
+                # Check if percentile images exist for the selected quality parameter.
+                if (perc_dict and 
+                    state_selected in perc_dict and 
+                    district_block_selected in perc_dict[state_selected] and 
+                    quality_param_selected in perc_dict[state_selected][district_block_selected]):
+                    pct_dict = perc_dict[state_selected][district_block_selected][quality_param_selected]
+                    percentile_options = list(pct_dict)
+                    formatted_options = ["select", "All"] + [f"At {opt} percentile" for opt in percentile_options]
+                    percentile_selected = st.sidebar.selectbox("Select True vs Predicted", formatted_options)
+                    
+                    if percentile_selected != "select":
+                        # When a specific percentile is chosen, hide base image.
+                        show_base = False
+                        if percentile_selected == "All":
+                            for opt, file_path in pct_dict.items():
+                                try:
+                                    image = load_display_image(file_path)
+                                    st.image(image, use_container_width=True)
+                                except Exception as e:
+                                    st.error(f"Error opening {file_path}: {e}")
+                        else:
+                            raw_pct = percentile_selected.replace("At ", "").replace(" percentile", "").strip()
+                            file_path = pct_dict.get(raw_pct)
+                            if file_path:
+                                try:
+                                    image = load_display_image(file_path)
+                                    st.image(image, use_container_width=True)
+                                except Exception as e:
+                                    st.error(f"Error opening {file_path}: {e}")
                             else:
-                                raw_pct = percentile_selected.replace("At ", "").replace(" percentile", "").strip()
-                                file_path = pct_dict.get(raw_pct)
-                                if file_path:
-                                    try:
-                                        image = Image.open(file_path)
-                                        st.image(image, use_container_width=True)
-                                    except Exception as e:
-                                        st.error(f"Error opening {file_path}: {e}")
-                                else:
-                                    st.error("No image found for the selected percentile.")
+                                st.error("No image found for the selected percentile.")
+                else:
+                    st.info("No percentile images available for the selected quality parameter.")
+            
+            # If no percentile selection is made, display the base image(s)
+            if show_base:
+                if quality_param_selected == "All":
+                    for param, file_path in base_dict[state_selected][district_block_selected].items():
+                        try:
+                            image = load_display_image(file_path)
+                            st.image(image, use_container_width=True)
+                        except Exception as e:
+                            st.error(f"Error opening {file_path}: {e}")
+                elif quality_param_selected != "select":
+                    base_image_path = base_dict[state_selected][district_block_selected].get(quality_param_selected)
+                    if base_image_path:
+                        try:
+                            image = load_display_image(base_image_path)
+                            st.image(image, use_container_width=True)
+                        except Exception as e:
+                            st.error(f"Error opening base image {base_image_path}: {e}")
                     else:
-                        st.info("No percentile images available for the selected quality parameter.")
-                
-                # If no percentile selection is made, display the base image(s)
-                if show_base:
-                    if quality_param_selected == "All":
-                        for param, file_path in base_dict[state_selected][district_block_selected].items():
-                            try:
-                                image = Image.open(file_path)
-                                st.image(image, use_container_width=True)
-                            except Exception as e:
-                                st.error(f"Error opening {file_path}: {e}")
-                    elif quality_param_selected != "select":
-                        base_image_path = base_dict[state_selected][district_block_selected].get(quality_param_selected)
-                        if base_image_path:
-                            try:
-                                image = Image.open(base_image_path)
-                                st.image(image, use_container_width=True)
-                            except Exception as e:
-                                st.error(f"Error opening base image {base_image_path}: {e}")
-                        else:
-                            st.info("No base image available for the selected quality parameter.")
+                        st.info("No base image available for the selected quality parameter.")
 
 # -----------------------------
 # Market Section (Placeholder with additional dropdowns for Market parameters)
@@ -299,31 +546,26 @@ elif section == "Market":
     st.sidebar.header("Market Options")
     # Build file dictionary from folder for Market images (similar to meteorological variables)
     market_folder = "Market"  # Folder containing market images (e.g., Yield plots)
-    market_dict = build_file_dict_from_folder(market_folder)
+    market_dict = build_file_dict_from_folder(market_folder, _dir_signature(market_folder))
     
     if market_dict:
-        state_options = sorted(list(market_dict.keys()))
-        state_selected = st.sidebar.selectbox("Select State", ["select"] + state_options)
+        state_selected, district_block_selected = select_district_block(market_dict)
         
-        if state_selected != "select":
-            district_block_options = sorted(list(market_dict[state_selected].keys()))
-            district_block_selected = st.sidebar.selectbox("Select District-Block", ["select"] + district_block_options)
+        if district_block_selected != "select":
+            # Third dropdown: Market Parameter
+            market_params = list(market_dict[state_selected][district_block_selected])
+            market_param_selected = st.sidebar.selectbox("Select Market Parameter", ["select"] + market_params)
             
-            if district_block_selected != "select":
-                # Third dropdown: Market Parameter
-                market_params = sorted(list(market_dict[state_selected][district_block_selected].keys()))
-                market_param_selected = st.sidebar.selectbox("Select Market Parameter", ["select"] + market_params)
-                
-                if market_param_selected != "select":
-                    file_path = market_dict[state_selected][district_block_selected].get(market_param_selected)
-                    if file_path:
-                        try:
-                            image = Image.open(file_path)
-                            st.image(image, use_container_width=True)
-                        except Exception as e:
-                            st.error(f"Error opening {file_path}: {e}")
-                    else:
-                        st.error("No image found for the selected market parameter.")
+            if market_param_selected != "select":
+                file_path = market_dict[state_selected][district_block_selected].get(market_param_selected)
+                if file_path:
+                    try:
+                        image = load_display_image(file_path)
+                        st.image(image, use_container_width=True)
+                    except Exception as e:
+                        st.error(f"Error opening {file_path}: {e}")
+                else:
+                    st.error("No image found for the selected market parameter.")
 
 # -----------------------------
 # What If Section (Placeholder)